@@ -326,7 +326,7 @@ class BinanceAccount(Account):
         try:
             self.simple_client.client.cancel_order(symbol=stock_id, orderId=order_id)
         except Exception as e:
-            logging.warning(f"cancel_order: Cannot cancel order {order_id}: {e}")
+            logging.warning("cancel_order: Cannot cancel order %s: %s", order_id, e)
 
     def get_orders(self):
 
@@ -8,7 +8,8 @@ from fugle_trade.util import setup_keyring, set_password
 from finlab.online.base_account import Account, Stock, Order
 from finlab.online.enums import *
 from finlab.markets.tw import TWMarket
-from finlab.online.order_executor import Position
+from finlab.online.order_executor import (
+    Position, AFTER_HOURS_ODD_LOT_START, AFTER_HOURS_FIXED_PRICE_START, AFTER_HOURS_END)
 from finlab import data
 
 from threading import Thread
@@ -22,6 +23,13 @@ import copy
 import time
 import os
 
+# 台灣時間與 UTC 的時差
+_TW_OFFSET = datetime.timedelta(hours=8)
+_TW_TZ = datetime.timezone(_TW_OFFSET)
+
+# 股數換算張數
+_DEC_1000 = Decimal(1000)
+
 trades = {}
 threads = {}
 callbacks = {}
@@ -83,7 +91,7 @@ class FugleAccount(Account):
             except Exception as e:
                 import traceback
                 traceback.print_exc()
-                logging.warning(f"on_order: Cannot process order {order}: {e}")
+                logging.warning("on_order: Cannot process order %s: %s", order, e)
 
         if self.user_account not in threads:
             self.thread = Thread(target=lambda: self.sdk.connect_websocket())
@@ -123,10 +131,11 @@ class FugleAccount(Account):
         }[order_cond]
 
         ap_code = APCode.IntradayOdd if odd_lot else APCode.Common
-        now = datetime.datetime.utcnow() + datetime.timedelta(hours=8)
-        if datetime.time(13, 40) < datetime.time(now.hour, now.minute) and datetime.time(now.hour, now.minute) < datetime.time(14, 30) and odd_lot:
+        now = datetime.datetime.utcnow() + _TW_OFFSET
+        minute_of_day = now.hour * 60 + now.minute
+        if odd_lot and AFTER_HOURS_ODD_LOT_START < minute_of_day < AFTER_HOURS_END:
             ap_code = APCode.Odd
-        if datetime.time(14, 00) < datetime.time(now.hour, now.minute) and datetime.time(now.hour, now.minute) < datetime.time(14, 30) and not odd_lot:
+        if not odd_lot and AFTER_HOURS_FIXED_PRICE_START < minute_of_day < AFTER_HOURS_END:
             ap_code = APCode.AfterMarket
             price_flag = PriceFlag.Limit
 
@@ -146,7 +155,7 @@ class FugleAccount(Account):
             ret = self.sdk.place_order(order)
         except Exception as e:
             logging.warning(
-                f"create_order: Cannot create order of {params}: {e}")
+                "create_order: Cannot create order of %s: %s", params, e)
             return
         
         order_id = self.get_org_order_id(ret)
@@ -164,7 +173,7 @@ class FugleAccount(Account):
 
         if order_id not in trades[self.user_account]:
             logging.warning(
-                f"update_order: Order id {order_id} not found, cannot update the price.")
+                "update_order: Order id %s not found, cannot update the price.", order_id)
 
         if price is not None:
             try:
@@ -194,7 +203,7 @@ class FugleAccount(Account):
                         trades[self.user_account][order_id].org_order, price)
             except ValueError as ve:
                 logging.warning(
-                    f"update_order: Cannot update price of order {order_id}: {ve}")
+                    "update_order: Cannot update price of order %s: %s", order_id, ve)
 
 
     def cancel_order(self, order_id):
@@ -207,7 +216,7 @@ class FugleAccount(Account):
             self.sdk.cancel_order(trades[self.user_account][order_id].org_order)
         except Exception as e:
             logging.warning(
-                f"cancel_order: Cannot cancel order {order_id}: {e}")
+                "cancel_order: Cannot cancel order %s: %s", order_id, e)
             
 
     def get_org_order_id(self, org_order):
@@ -227,7 +236,7 @@ class FugleAccount(Account):
             try:
                 orders = self.sdk.get_order_results()
                 success = True
-            except:
+            except Exception:
                 logging.warning("get_orders: Cannot get orders, sleep for 1 minute")
                 fetch_count += 1
                 time.sleep(60)
@@ -256,8 +265,7 @@ class FugleAccount(Account):
                     ret[s].close = json_response['previousClose']
 
             except Exception as e:
-                logging.warn(f"Fugle API: cannot get stock {s}")
-                logging.warn(e)
+                logging.warning("Fugle API: cannot get stock %s: %s", s, e)
 
         return ret
 
@@ -285,12 +293,12 @@ class FugleAccount(Account):
 
             # removed: position of stk_dats is not completed
             # total_qty = sum([int(d['qty']) for d in i['stk_dats']]) / 1000
-            total_qty = Decimal(int(i['qty_l']) +
-                         int(i['qty_bm']) - int(i['qty_sm'])) / 1000
+            shares = int(i['qty_l']) + int(i['qty_bm']) - int(i['qty_sm'])
 
             o = order_condition[i['trade']]
 
-            if total_qty != 0:
+            if shares != 0:
+                total_qty = Decimal(shares) / _DEC_1000
                 ret.append({
                     'stock_id': i['stk_no'],
                     'quantity': total_qty if o != OrderCondition.SHORT_SELLING else -total_qty,
@@ -315,7 +323,7 @@ class FugleAccount(Account):
         return self.sdk.get_balance()['available_balance']
     
     def get_settlement(self):
-        tw_now = datetime.datetime.utcnow() + datetime.timedelta(hours=8)
+        tw_now = datetime.datetime.utcnow() + _TW_OFFSET
         settlements = self.sdk.get_settlements()
         settlements = sum(int(settlement['price']) for settlement in settlements if datetime.datetime.strptime(
             settlement['c_date'] + ' 10:00', '%Y%m%d %H:%M') > tw_now)
@@ -337,8 +345,9 @@ class FugleAccount(Account):
         @self.acc.sdk.on('dealt')
         def on_dealt(data):
             if isinstance(data, dict):
-                time = (datetime.datetime.strptime(f"{str((datetime.datetime.utcnow()+datetime.timedelta(hours=8)).date())} {data['mat_time']}", "%Y-%m-%d %H%M%S%f")-datetime.timedelta(
-                    hours=8)).replace(tzinfo=datetime.timezone(datetime.timedelta(hours=8))).isoformat()
+                tw_date = (datetime.datetime.utcnow() + _TW_OFFSET).date()
+                time = (datetime.datetime.strptime(f"{tw_date} {data['mat_time']}", "%Y-%m-%d %H%M%S%f") - _TW_OFFSET)\
+                    .replace(tzinfo=_TW_TZ).isoformat()
 
                 o = Order(order_id=data['ord_no'], stock_id=data['stock_no'],
                           action='BUY' if data['buy_sell'] == 'B' else 'SELL', price=data['mat_price'],
@@ -3,7 +3,9 @@ from finlab.online.enums import *
 from finlab import data
 from decimal import Decimal
 import pandas as pd
+import numpy as np
 import requests
+import itertools
 import datetime
 import logging
 import numbers
@@ -14,6 +16,12 @@ import math
 
 logger = logging.getLogger(__name__)
 
+# 台股盤後交易時段，以台灣時間的當日分鐘數 (hour * 60 + minute) 表示，比較時不含起訖時間
+# 盤後零股 13:40~14:30、盤後定價 14:00~14:30
+AFTER_HOURS_ODD_LOT_START = 13 * 60 + 40
+AFTER_HOURS_FIXED_PRICE_START = 14 * 60
+AFTER_HOURS_END = 14 * 60 + 30
+
 class Position():
 
     """使用者可以利用 Position 輕鬆建構股票的部位，並且利用 OrderExecuter 將此部位同步於實際的股票帳戶。
@@ -118,7 +126,37 @@ class Position():
         ret = cls({})
         ret.position = ret._format_quantity(position)
         return ret
-    
+
+    @classmethod
+    def from_arrays(cls, stock_ids, quantities, order_conditions=None):
+        """利用股票代號、張數與下單條件三個等長序列建構股票部位
+
+        與 `from_list` 相同，但不需要先建立並複製每一檔股票的 `dict`，適合由券商持倉直接轉換。
+
+        Attributes:
+            stock_ids (`list` of `str`): 股票代號
+            quantities (`list` of `number.Number`): 張數，字串會轉換成 `Decimal`
+            order_conditions (`list` of `OrderCondition`): 現股融資融券、先買後賣，預設全部為 `OrderCondition.CASH`
+
+        Examples:
+              ```py
+              from finlab.online.enums import OrderCondition
+              from finlab.online.order_executor import Position
+
+              Position.from_arrays(['1101', '2330'], [1, 2], [OrderCondition.CASH, OrderCondition.CASH])
+              ```
+        """
+        if order_conditions is None:
+            order_conditions = itertools.repeat(OrderCondition.CASH)
+
+        ret = cls({})
+        ret.position = [{
+            'stock_id': s,
+            'quantity': Decimal(q) if isinstance(q, str) else q,
+            'order_condition': c,
+        } for s, q, c in zip(stock_ids, quantities, order_conditions)]
+        return ret
+
     def to_list(self):
         ret = []
 
@@ -210,7 +248,7 @@ class Position():
         for idx in weights.index:
             stock_id = idx.split(' ')[0]
             if stock_id not in price:
-                logger.warning(f"Stock {stock_id} is not in price data. It is dropped from the position.")
+                logger.warning("Stock %s is not in price data. It is dropped from the position.", stock_id)
                 
         weights.index = weights.index.astype(str)
         weights = weights[weights.index.str.split(' ').str[0].isin(price.index)]
@@ -328,7 +366,7 @@ class Position():
         for s in w.index.tolist():
             if s.split(' ')[0] not in kwargs['price'] or kwargs['price'][s.split(' ')[0]] != kwargs['price'][s.split(' ')[0]]:
                 w = w.drop(s)
-                logger.warning(f"Stock {s} is not in price data. It is dropped from the position.")
+                logger.warning("Stock %s is not in price data. It is dropped from the position.", s)
 
         return cls.from_weight(w, fund, **kwargs)
     
@@ -847,4 +885,33 @@ def calculate_price_with_extra_bid(price, extra_bid_pct):
         else:
             result = math.ceil(result / 5) * 5
 
-    return result
\ No newline at end of file
+    return result
+
+
+def calculate_price_with_extra_bid_batch(prices, extra_bid_pcts):
+    """一次計算多檔股票加價後的委託價，結果與逐筆呼叫 `calculate_price_with_extra_bid` 相同
+
+    Args:
+        prices (array-like): 股票價格
+        extra_bid_pcts (array-like or float): 加價比例，正數無條件捨去、負數無條件進位到升降單位
+
+    Returns:
+        np.ndarray: 調整後的委託價
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    pcts = np.broadcast_to(np.asarray(extra_bid_pcts, dtype=np.float64), prices.shape)
+
+    result = prices * (1 + pcts)
+
+    # 台股升降單位：10 元以下 0.01、50 元以下 0.05、100 元以下 0.1、500 元以下 0.5、1000 元以下 1、以上 5
+    small = result <= 10
+    large = result > 1000
+    scale = np.select([small, result <= 50, result <= 100, result <= 500],
+                      [100, 20, 10, 2], default=1)
+    scaled = np.where(large, result / 5, result * scale)
+    # 10 元以下先四捨五入到小數三位，np.round 為先放大再取偶數的近似，與內建 round 結果不同，需逐筆以 round 計算
+    scaled[small] = [round(r, 3) * 100 for r in result[small].tolist()]
+    rounded = np.where(pcts > 0, np.floor(scaled), np.ceil(scaled))
+    ticked = np.where(large, rounded * 5, rounded / scale)
+
+    return np.where(pcts == 0, prices, ticked)
@@ -2,10 +2,17 @@
 Schwab 帳戶操作模組
 """
 
+import asyncio
 import logging
+import math
 import os
-from decimal import Decimal
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from decimal import ROUND_DOWN, Decimal
+from types import MappingProxyType
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from finlab.markets.us import USMarket
 from finlab.online.base_account import Account, Order, Stock
@@ -13,7 +20,82 @@ from finlab.online.enums import Action, OrderCondition, OrderStatus
 from finlab.online.order_executor import Position
 from schwab.auth import client_from_token_file
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+try:
+    from orjson import loads as _loads
+except ImportError:
+    from json import loads as _loads
+
+logger = logging.getLogger(__name__)
+
+# finlab 的數量單位為張，Schwab 的股數需除以 1000
+_THOUSAND = Decimal(1000)
+
+# format_price 的截斷精度：1 美元以上取到分，以下取到萬分位
+_ONE = Decimal(1)
+_Q2 = Decimal('0.01')
+_Q4 = Decimal('0.0001')
+
+# FinLab 的 Action 對應到 Schwab 的 instruction
+_ACTION_STR = {Action.BUY: 'BUY', Action.SELL: 'SELL'}
+
+# 每張委託單共用的固定欄位
+_ORDER_TEMPLATE = {'session': 'NORMAL', 'duration': 'DAY', 'orderStrategyType': 'SINGLE'}
+
+# Schwab 委託單狀態對應到 FinLab 的 OrderStatus
+_NEW_STATUSES = frozenset({
+    'AWAITING_PARENT_ORDER',
+    'AWAITING_CONDITION',
+    'AWAITING_STOP_CONDITION',
+    'AWAITING_MANUAL_REVIEW',
+    'ACCEPTED',
+    'AWAITING_UR_OUT',
+    'PENDING_ACTIVATION',
+    'QUEUED',
+    'WORKING',
+    'PENDING_CANCEL',
+    'PENDING_REPLACE',
+    'NEW',
+    'AWAITING_RELEASE_TIME',
+    'PENDING_ACKNOWLEDGEMENT',
+    'PENDING_RECALL',
+    'UNKNOWN',
+})
+_CANCEL_STATUSES = frozenset({'REJECTED', 'CANCELED', 'REPLACED', 'EXPIRED'})
+_FILLED_STATUSES = frozenset({'FILLED'})
+
+_STATUS_MAP = MappingProxyType({
+    **dict.fromkeys(_NEW_STATUSES, OrderStatus.NEW),
+    **dict.fromkeys(_CANCEL_STATUSES, OrderStatus.CANCEL),
+    **dict.fromkeys(_FILLED_STATUSES, OrderStatus.FILLED),
+})
+
+# Schwab 委託單 instruction 對應到 FinLab 的 OrderCondition 與 Action
+_CONDITION_MAP = MappingProxyType({
+    'BUY': OrderCondition.CASH,  # EQUITY (Stocks and ETFs)
+    'SELL': OrderCondition.CASH,  # EQUITY (Stocks and ETFs)
+    'BUY_TO_COVER': OrderCondition.CASH,  # EQUITY (Stocks and ETFs)
+    'SELL_SHORT': OrderCondition.SHORT_SELLING,  # EQUITY (Stocks and ETFs)
+    'BUY_TO_OPEN': OrderCondition.CASH,  # Option
+    'BUY_TO_CLOSE': OrderCondition.CASH,  # Option
+    'SELL_TO_OPEN': OrderCondition.CASH,  # Option
+    'SELL_TO_CLOSE': OrderCondition.CASH,  # Option
+})
+
+_ACTION_MAP = MappingProxyType({
+    'BUY': Action.BUY,  # EQUITY (Stocks and ETFs)
+    'SELL': Action.SELL,  # EQUITY (Stocks and ETFs)
+    'BUY_TO_COVER': Action.BUY,  # EQUITY (Stocks and ETFs)
+    'SELL_SHORT': Action.SELL,  # EQUITY (Stocks and ETFs)
+    'BUY_TO_OPEN': Action.BUY,  # Option
+    'BUY_TO_CLOSE': Action.BUY,  # Option
+    'SELL_TO_OPEN': Action.SELL,  # Option
+    'SELL_TO_CLOSE': Action.SELL,  # Option
+})
+
+# 帳戶資料中各欄位的路徑，供 _dig 使用
+_TOTAL_BALANCE_PATH = (0, 'aggregatedBalance', 'currentLiquidationValue')
+_CASH_PATH = (0, 'securitiesAccount', 'currentBalances', 'cashBalance')
+_POSITIONS_PATH = (0, 'securitiesAccount', 'positions')
 
 
 class SchwabAccount(Account):
@@ -28,6 +110,10 @@ class SchwabAccount(Account):
         client: Schwab 客戶端實例
         account_hash (str): 帳戶哈希值
         trades (dict): 交易記錄
+        quote_ttl (float): 報價快取的有效秒數
+        quote_batch_window (float): 合併報價請求的等待秒數，設為 0 則不等待
+        order_lookback (timedelta): 查詢訂單時回溯的下單時間範圍，預設與 schwab-py 相同為 60 天，
+            確定沒有其他管道下的長效 (GTC) 委託時可以縮短
 
     """
 
@@ -54,12 +140,21 @@ class SchwabAccount(Account):
         Raises:
             ValueError: 當必要的參數缺失時
         """
-        self.api_key = api_key or os.environ['SCHWAB_API_KEY']
-        self.app_secret = app_secret or os.environ['SCHWAB_SECRET']
-        self.token_path = token_path or os.environ['SCHWAB_TOKEN_PATH']
-
-        if not all([self.api_key, self.app_secret, self.token_path]):
-            raise ValueError('API 金鑰、應用程式密鑰和令牌路徑都必須提供')
+        self.api_key = api_key or os.environ.get('SCHWAB_API_KEY')
+        self.app_secret = app_secret or os.environ.get('SCHWAB_SECRET')
+        self.token_path = token_path or os.environ.get('SCHWAB_TOKEN_PATH')
+
+        missing = [
+            name
+            for name, value in (
+                ('SCHWAB_API_KEY', self.api_key),
+                ('SCHWAB_SECRET', self.app_secret),
+                ('SCHWAB_TOKEN_PATH', self.token_path),
+            )
+            if not value
+        ]
+        if missing:
+            raise ValueError(f'API 金鑰、應用程式密鑰和令牌路徑都必須提供，缺少: {missing}')
 
         try:
             self.client = client_from_token_file(
@@ -68,12 +163,44 @@ class SchwabAccount(Account):
                 token_path=self.token_path,
             )
         except Exception as e:
-            logging.error(f'無法初始化 Schwab 客戶端: {e}')
+            logger.error('無法初始化 Schwab 客戶端: %s', e)
             raise
 
-        self.account_hash = self.client.get_account_numbers().json()[0]['hashValue']
+        # API 呼叫使用的欄位列舉，同步與非同步客戶端共用
+        self._quote_field = self.client.Quote.Fields.QUOTE
+        self._positions_field = self.client.Account.Fields.POSITIONS
+
+        self.account_hash = _loads(self.client.get_account_numbers().content)[0]['hashValue']
         self.trades = {}
 
+        # 報價請求批次：等待合併中的批次與已送出的批次，並行呼叫共用同一個 Future
+        self.quote_batch_window = 0.02
+        self._pending_quotes: Optional[Tuple[set, Future]] = None
+        self._inflight_quotes: Dict[frozenset, Future] = {}
+        self._inflight_lock = threading.Lock()
+
+        # 報價快取，股票代碼對應到 (取得時間, 報價資料)
+        self.quote_ttl = 2.0
+        self._quote_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._quote_lock = threading.Lock()
+
+        # 帳戶資料快取，供 get_position、get_total_balance 與 get_cash 共用
+        self._snapshot_ttl = 1.0
+        self._accounts_cache: Optional[List[Dict[str, Any]]] = None
+        self._accounts_cache_ts = 0.0
+
+        # 未完成訂單快取，短時間內重複呼叫 get_orders 時直接使用上一次的結果
+        self._orders_ttl = 1.0
+        self._orders_cache: Optional[Dict[int, Order]] = None
+        self._orders_cache_ts = 0.0
+
+        # 查詢訂單時回溯的範圍，需涵蓋其他管道下的長效 (GTC) 委託，否則 cancel_orders 會漏刪
+        self.order_lookback = timedelta(days=60)
+
+        # 背景報價更新執行緒，由 start_quote_stream 啟動
+        self._quote_stream: Optional[threading.Thread] = None
+        self._quote_stream_stop = threading.Event()
+
     def create_order(
         self,
         action: Action,
@@ -98,48 +225,30 @@ class SchwabAccount(Account):
             order_cond (OrderCondition): 訂單條件，默認為 OrderCondition.CASH
 
         Raises:
-            ValueError: 當股票代碼不在價格資訊中時
             ValueError: 當數量小於等於 0 時
 
+        Note:
+            送出委託前不另外查詢報價，無效的股票代碼由 Schwab 拒絕並記錄在警告中
         """
         try:
-            pinfo = self.get_price_info([stock_id])
-
-            if stock_id not in pinfo:
-                raise ValueError(f'股票 {stock_id} 不在價格資訊中')
-
+            market = market_order or best_price_limit
             if quantity <= 0:
                 raise ValueError(f'數量必須為正數，得到 {quantity}')
 
-            action_str = 'BUY' if action == Action.BUY else 'SELL'
-
-            order = {
-                'session': 'NORMAL',
-                'duration': 'DAY',
-                'orderType': 'MARKET' if market_order or best_price_limit else 'LIMIT',
-                'orderLegCollection': [
-                    {
-                        'instruction': action_str,
-                        'instrument': {'assetType': 'EQUITY', 'symbol': stock_id},
-                        'quantity': quantity,
-                    }
-                ],
-                'orderStrategyType': 'SINGLE',
-            }
-
-            if not (market_order or best_price_limit):
-                order['price'] = price
+            order = _build_order(_ACTION_STR[action], stock_id, quantity, price, market=market)
 
             trade_response = self.client.place_order(self.account_hash, order)
             if trade_response.status_code == 201:
-                logging.info(f'API: 成功創建訂單, {order}')
+                self._orders_cache = None
+                self._accounts_cache = None
+                logger.info('API: 成功創建訂單, %s', stock_id)
             else:
-                logging.warning(
-                    f'API: 無法創建訂單: {trade_response.status_code}: {trade_response.text}'
+                logger.warning(
+                    'API: 無法創建訂單: %s: %s', trade_response.status_code, trade_response.text
                 )
 
         except Exception as e:
-            logging.error(f'API: 創建訂單時發生錯誤: {e}')
+            logger.error('API: 創建訂單時發生錯誤: %s', e)
             raise
 
     def get_price_info(self, stock_ids: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
@@ -158,35 +267,170 @@ class SchwabAccount(Account):
             return {}
 
         try:
-            quote_response = self.client.get_quotes(
-                stock_ids, fields=self.client.Quote.Fields.QUOTE
-            )
-            if quote_response.status_code != 200:
-                logging.error(
-                    f'API: 獲取報價失敗: {quote_response.status_code}: {quote_response.text}'
-                )
-                return {}
+            # _get_quotes 只回傳有報價的股票，直接走訪結果即可
+            ref = {}
+            for s, row in self._get_quotes(stock_ids).items():
+                quote = row['quote']
+                ref[s] = {
+                    '收盤價': quote['closePrice'],
+                    '漲停價': quote['52WeekHigh'],
+                    '跌停價': quote['52WeekLow'],
+                }
+
+            missing = [s for s in stock_ids if s not in ref]
+            if missing:
+                logger.warning('API: 無法獲取股票 %s 的資訊', missing)
+            return ref
 
-            quote_json = quote_response.json()
+        except Exception as e:
+            logger.error('API: 獲取價格資訊時發生錯誤: %s', e)
+            return {}
 
-            ref = {}
+    def _get_quotes(self, stock_ids: List[str]) -> Dict[str, Any]:
+        """取得股票報價的原始資料
+
+        在 quote_ttl 秒內取得過的報價直接從快取回傳，只有過期或未快取的股票才會向 API 查詢。
+
+        Args:
+            stock_ids (List[str]): 股票代碼列表
+
+        Returns:
+            Dict[str, Any]: 股票代碼到 Schwab 報價資料的映射，無法取得報價的股票不會出現在結果中
+
+        Raises:
+            ValueError: 當 API 回傳非 200 狀態碼時
+        """
+        now = time.monotonic()
+        ret = {}
+        stale = []
+
+        with self._quote_lock:
             for s in stock_ids:
+                entry = self._quote_cache.get(s)
+                if entry is not None and now - entry[0] < self.quote_ttl:
+                    ret[s] = entry[1]
+                else:
+                    stale.append(s)
+
+        if not stale:
+            return ret
+
+        fetched = self._store_quotes(self._fetch_quotes(stale))
+        ret.update((s, fetched[s]) for s in stale if s in fetched)
+        return ret
+
+    def _store_quotes(self, quote_json: Dict[str, Any]) -> Dict[str, Any]:
+        """將 API 回傳的報價寫入快取
+
+        Args:
+            quote_json (Dict[str, Any]): Schwab get_quotes 回傳的資料
+
+        Returns:
+            Dict[str, Any]: 含有報價的股票代碼到報價資料的映射
+        """
+        fetched_at = time.monotonic()
+        ret = {}
+
+        with self._quote_lock:
+            for s, q in quote_json.items():
+                if isinstance(q, dict) and 'quote' in q:
+                    self._quote_cache[s] = (fetched_at, q)
+                    ret[s] = q
+
+        return ret
+
+    def start_quote_stream(self, stock_ids: List[str], interval: float = 1.0) -> None:
+        """啟動背景執行緒定期更新報價快取
+
+        對於反覆查詢的股票，背景更新讓快取保持有效，get_price_info 與 get_stocks 不需等待 API 回應。
+        已有執行中的背景更新時會先停止再以新的股票列表重新啟動。
+
+        Args:
+            stock_ids (List[str]): 要持續更新報價的股票代碼列表
+            interval (float): 更新間隔秒數，預設為 1.0，應小於 quote_ttl 才能保持快取有效
+        """
+        self.stop_quote_stream()
+
+        stock_ids = list(stock_ids)
+        stop = self._quote_stream_stop = threading.Event()
+
+        def run():
+            while not stop.is_set():
                 try:
-                    quote = quote_json[s]['quote']
-                    ref[s] = {
-                        '收盤價': quote['closePrice'],
-                        '漲停價': quote['52WeekHigh'],
-                        '跌停價': quote['52WeekLow'],
-                    }
+                    self._store_quotes(self._fetch_quotes(stock_ids))
                 except Exception as e:
-                    logging.warning(f'API: 無法獲取股票 {s} 的資訊: {e}')
-            return ref
+                    logger.warning('API: 背景更新報價時發生錯誤: %s', e)
+                stop.wait(interval)
+
+        self._quote_stream = threading.Thread(target=run, name='schwab-quote-stream', daemon=True)
+        self._quote_stream.start()
+
+    def stop_quote_stream(self) -> None:
+        """停止背景報價更新執行緒"""
+        self._quote_stream_stop.set()
+        if self._quote_stream is not None:
+            self._quote_stream.join()
+            self._quote_stream = None
+
+    def _fetch_quotes(self, stock_ids: List[str]) -> Dict[str, Any]:
+        """向 API 查詢股票報價
 
+        quote_batch_window 秒內陸續到達的請求會合併成一次 API 呼叫，已在查詢中的股票則直接等待該次結果，
+        例如逐筆呼叫 create_order 調整部位時，只需送出一次報價請求。
+
+        Args:
+            stock_ids (List[str]): 股票代碼列表
+
+        Returns:
+            Dict[str, Any]: Schwab 回傳的報價資料，可能包含同批次其他呼叫者查詢的股票
+
+        Raises:
+            ValueError: 當 API 回傳非 200 狀態碼時
+        """
+        wanted = set(stock_ids)
+
+        with self._inflight_lock:
+            future = next(
+                (f for key, f in self._inflight_quotes.items() if wanted <= key), None
+            )
+            owner = False
+            if future is None:
+                if self._pending_quotes is None:
+                    self._pending_quotes = (set(), Future())
+                    owner = True
+                symbols, future = self._pending_quotes
+                symbols.update(wanted)
+
+        if not owner:
+            return future.result()
+
+        # 等待同一時間窗內的其他請求加入批次
+        if self.quote_batch_window > 0:
+            time.sleep(self.quote_batch_window)
+
+        with self._inflight_lock:
+            symbols, future = self._pending_quotes
+            self._pending_quotes = None
+            key = frozenset(symbols)
+            self._inflight_quotes[key] = future
+
+        try:
+            quote_response = self.client.get_quotes(list(key), fields=self._quote_field)
+            if quote_response.status_code != 200:
+                raise ValueError(
+                    f'獲取報價失敗: {quote_response.status_code}: {quote_response.text}'
+                )
+            future.set_result(_loads(quote_response.content))
         except Exception as e:
-            logging.error(f'API: 獲取價格資訊時發生錯誤: {e}')
-            return {}
+            future.set_exception(e)
+        finally:
+            with self._inflight_lock:
+                if self._inflight_quotes.get(key) is future:
+                    del self._inflight_quotes[key]
 
-    def update_order(self, order_id: int, price: float) -> None:
+        return future.result()
+
+    def update_order(self, order_id: int, price: float, *, order: Optional[Order] = None) -> None:
         """更新現有訂單的價格
 
         通過取消當前訂單並創建一個具有更新價格的新訂單。
@@ -194,6 +438,7 @@ class SchwabAccount(Account):
         Args:
             order_id (int): 要更新的訂單ID
             price (float): 訂單的新價格
+            order (Optional[Order]): 已取得的訂單物件，提供時不再重新查詢訂單
 
         Raises:
             ValueError: 如果訂單無法更新
@@ -202,18 +447,20 @@ class SchwabAccount(Account):
             美股為零股，finlab order's quantity 單位 1 張，所以 quantity 要乘以 1000
         """
         try:
-            order = self.get_orders()[order_id]
+            if order is None:
+                order = self._get_order(order_id)
             action = order.action
             stock_id = order.stock_id
-            quantity = order.quantity - order.filled_quantity
-            quantity *= 1000
+            shares = int(round((order.quantity - order.filled_quantity) * 1000))
+            if shares <= 0:
+                raise ValueError(f'訂單 {order_id} 已無未成交股數')
 
             self.cancel_order(order_id)
             self.create_order(
-                action=action, stock_id=stock_id, quantity=quantity, price=price, odd_lot=True
+                action=action, stock_id=stock_id, quantity=shares, price=price, odd_lot=True
             )
         except Exception as e:
-            logging.error(f'更新訂單 {order_id} 時發生錯誤: {e}')
+            logger.error('更新訂單 %s 時發生錯誤: %s', order_id, e)
             raise ValueError(f'無法更新訂單 {order_id}') from e
 
     def cancel_order(self, order_id: int) -> None:
@@ -222,19 +469,74 @@ class SchwabAccount(Account):
         Args:
             order_id (int): 要取消的訂單ID
         """
-        if order_id not in self.trades:
-            self.trades = self.get_orders()
+        self._cancel_order(order_id)
+
+    def _get_order(self, order_id: int) -> Order:
+        """取得單筆訂單
 
+        get_orders 的快取仍有效時直接使用，否則只查詢這一筆訂單，不下載所有帳戶的委託。
+
+        Args:
+            order_id (int): 訂單ID
+
+        Returns:
+            Order: 訂單物件
+
+        Raises:
+            ValueError: 當 API 回傳非 200 狀態碼時
+        """
+        orders = self._orders_cache
+        if (
+            orders is not None
+            and order_id in orders
+            and time.monotonic() - self._orders_cache_ts < self._orders_ttl
+        ):
+            return orders[order_id]
+
+        order_response = self.client.get_order(order_id, self.account_hash)
+        if order_response.status_code != 200:
+            raise ValueError(
+                f'獲取訂單 {order_id} 失敗: {order_response.status_code}: {order_response.text}'
+            )
+        return trade_to_order(_loads(order_response.content))
+
+    def cancel_orders(self, order_ids: List[int], max_concurrency: int = 10) -> None:
+        """同時取消多筆訂單
+
+        Args:
+            order_ids (List[int]): 要取消的訂單ID列表
+            max_concurrency (int): 同時送出的取消請求上限，預設為 10
+        """
+        if not order_ids:
+            return
+
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(order_ids))) as executor:
+            results = list(executor.map(self._cancel_order, order_ids))
+
+        logger.info('API: 批次取消訂單，成功 %s 筆，失敗 %s 筆', results.count(True), results.count(False))
+
+    def _cancel_order(self, order_id: int) -> bool:
+        """送出取消訂單請求
+
+        Args:
+            order_id (int): 要取消的訂單ID
+
+        Returns:
+            bool: 是否成功取消
+        """
         try:
             response = self.client.cancel_order(order_id, self.account_hash)
             if response.status_code == 200:
-                logging.info(f'API: 成功取消訂單 {order_id}')
-            else:
-                logging.warning(
-                    f'API: 無法取消訂單 {order_id}: {response.status_code}: {response.text}'
-                )
+                self._orders_cache = None
+                self._accounts_cache = None
+                logger.info('API: 成功取消訂單 %s', order_id)
+                return True
+            logger.warning(
+                'API: 無法取消訂單 %s: %s: %s', order_id, response.status_code, response.text
+            )
         except Exception as e:
-            logging.error(f'API: 取消訂單 {order_id} 時發生錯誤: {e}')
+            logger.error('API: 取消訂單 %s 時發生錯誤: %s', order_id, e)
+        return False
 
     def get_position(self) -> Position:
         """獲取當前持倉
@@ -243,55 +545,33 @@ class SchwabAccount(Account):
             Position: 當前持倉資訊
         """
         try:
-            position_response = self.client.get_accounts(
-                fields=self.client.Account.Fields.POSITIONS
-            )
-            if position_response.status_code != 200:
-                logging.error(
-                    f'API: 獲取持倉失敗: {position_response.status_code}: {position_response.text}'
-                )
-                return Position.from_list([])
-
-            position = position_response.json()[0]['securitiesAccount']['positions']
-
-            return Position.from_list(
-                # 計算 quantity，需要考慮 longQuantity 和 shortQuantity
-                [
-                    {
-                        'stock_id': p['instrument']['symbol'],
-                        'quantity': (float(p['longQuantity']) - float(p['shortQuantity'])) / 1000,
-                        'order_condition': OrderCondition.SHORT_SELLING if p['shortQuantity'] > 0 else OrderCondition.CASH,
-                    }
-                    for p in position
-                ]
-            )
+            return accounts_to_position(self._fetch_account_snapshot())
         except Exception as e:
-            logging.error(f'API: 獲取持倉時發生錯誤: {e}')
+            logger.error('API: 獲取持倉時發生錯誤: %s', e)
             return Position.from_list([])
 
     def get_orders(self) -> Dict[int, Order]:
         """獲取所有未完成的訂單
 
+        _orders_ttl 秒內重複呼叫時回傳上一次的結果，成功建立或取消訂單後快取即失效。
+
         Returns:
             Dict[int, Order]: 訂單ID到訂單對象的映射
         """
+        now = time.monotonic()
+        if self._orders_cache is not None and now - self._orders_cache_ts < self._orders_ttl:
+            return self._orders_cache
+
         try:
-            orders_response = self.client.get_orders_for_all_linked_accounts()
-            if orders_response.status_code != 200:
-                logging.error(
-                    f'API: 獲取訂單失敗: {orders_response.status_code}: {orders_response.text}'
+            self._orders_cache = orders_response_to_orders(
+                self.client.get_orders_for_all_linked_accounts(
+                    from_entered_datetime=datetime.now(timezone.utc) - self.order_lookback
                 )
-                return {}
-
-            orders = orders_response.json()
-
-            return {
-                t['orderId']: trade_to_order(t)
-                for t in orders
-                if map_trade_status(t['status']) == OrderStatus.NEW
-            }
+            )
+            self._orders_cache_ts = now
+            return self._orders_cache
         except Exception as e:
-            logging.error(f'API: 獲取訂單時發生錯誤: {e}')
+            logger.error('API: 獲取訂單時發生錯誤: %s', e)
             return {}
 
     def get_stocks(self, stock_ids: List[str]) -> Dict[str, Stock]:
@@ -304,29 +584,58 @@ class SchwabAccount(Account):
             Dict[str, Stock]: 股票代碼到股票資訊的映射
         """
         try:
-            quote_response = self.client.get_quotes(
-                stock_ids, fields=self.client.Quote.Fields.QUOTE
-            )
-            if quote_response.status_code != 200:
-                logging.error(
-                    f'API: 獲取股票資訊失敗: {quote_response.status_code}: {quote_response.text}'
-                )
-                return {}
-
-            json_response = quote_response.json()
+            ret = {s: quote_to_stock(q) for s, q in self._get_quotes(stock_ids).items()}
 
-            ret = {}
-            for s in stock_ids:
-                try:
-                    ret[s] = quote_to_stock(json_response[s])
-                except Exception as e:
-                    logging.warning(f'API: 無法獲取股票 {s} 的資訊: {e}')
+            missing = [s for s in stock_ids if s not in ret]
+            if missing:
+                logger.warning('API: 無法獲取股票 %s 的資訊', missing)
 
             return ret
         except Exception as e:
-            logging.error(f'API: 獲取股票資訊時發生錯誤: {e}')
+            logger.error('API: 獲取股票資訊時發生錯誤: %s', e)
             return {}
 
+    def _fetch_account_snapshot(self) -> List[Dict[str, Any]]:
+        """取得包含持倉與餘額的帳戶資料
+
+        持倉欄位的回應同時包含餘額，因此 get_position、get_cash 與 get_total_balance 共用同一份資料，
+        _snapshot_ttl 秒內重複呼叫時直接使用上一次的結果。
+
+        Returns:
+            List[Dict[str, Any]]: Schwab 回傳的帳戶資料
+
+        Raises:
+            ValueError: 當 API 回傳非 200 狀態碼時
+        """
+        now = time.monotonic()
+        if self._accounts_cache is not None and now - self._accounts_cache_ts < self._snapshot_ttl:
+            return self._accounts_cache
+
+        accounts_response = self.client.get_accounts(fields=self._positions_field)
+        return self._store_account_snapshot(accounts_response, now)
+
+    def _store_account_snapshot(self, accounts_response, fetched_at: float) -> List[Dict[str, Any]]:
+        """解析 get_accounts 的回應並寫入帳戶資料快取
+
+        Args:
+            accounts_response: Schwab get_accounts 的回應
+            fetched_at (float): 發出請求時的 time.monotonic()
+
+        Returns:
+            List[Dict[str, Any]]: Schwab 回傳的帳戶資料
+
+        Raises:
+            ValueError: 當 API 回傳非 200 狀態碼時
+        """
+        if accounts_response.status_code != 200:
+            raise ValueError(
+                f'獲取帳戶資料失敗: {accounts_response.status_code}: {accounts_response.text}'
+            )
+
+        self._accounts_cache = _loads(accounts_response.content)
+        self._accounts_cache_ts = fetched_at
+        return self._accounts_cache
+
     def get_total_balance(self) -> float:
         """獲取總資產餘額
 
@@ -334,18 +643,9 @@ class SchwabAccount(Account):
             float: 總資產餘額
         """
         try:
-            balance_response = self.client.get_accounts()
-            if balance_response.status_code != 200:
-                logging.error(
-                    f'API: 獲取總資產餘額失敗: {balance_response.status_code}: {balance_response.text}'
-                )
-                return 0
-
-            return float(
-                balance_response.json()[0]['aggregatedBalance']['currentLiquidationValue']
-            )
+            return accounts_to_total_balance(self._fetch_account_snapshot())
         except Exception as e:
-            logging.error(f'API: 獲取總資產餘額時發生錯誤: {e}')
+            logger.error('API: 獲取總資產餘額時發生錯誤: %s', e)
             return 0
 
     def get_cash(self) -> float:
@@ -355,18 +655,9 @@ class SchwabAccount(Account):
             float: 現金餘額
         """
         try:
-            cash_response = self.client.get_accounts()
-            if cash_response.status_code != 200:
-                logging.error(
-                    f'API: 獲取現金餘額失敗: {cash_response.status_code}: {cash_response.text}'
-                )
-                return 0
-
-            return float(
-                cash_response.json()[0]['securitiesAccount']['currentBalances']['cashBalance']
-            )
+            return accounts_to_cash(self._fetch_account_snapshot())
         except Exception as e:
-            logging.error(f'API: 獲取現金餘額時發生錯誤: {e}')
+            logger.error('API: 獲取現金餘額時發生錯誤: %s', e)
             return 0
 
     def get_settlement(self) -> int:
@@ -394,6 +685,301 @@ class SchwabAccount(Account):
         return USMarket()
 
 
+class AsyncSchwabAccount(SchwabAccount):
+    """使用 schwab-py 非同步客戶端的 Schwab 帳戶
+
+    同步介面 (create_order、get_position 等) 與 SchwabAccount 相同，另外提供以 async_ 開頭的
+    非同步查詢方法，可在同一個 event loop 中以 asyncio.gather 同時送出多個請求。
+    非同步客戶端 (httpx.AsyncClient) 的連線池綁定第一次使用的 event loop，所有 async_ 方法與 refresh_all
+    都必須在同一個長期執行的 event loop 中呼叫，不可每次以 asyncio.run 建立新的 loop；同步環境請直接使用同步方法。
+
+    Attributes:
+        async_client: schwab-py 的非同步客戶端實例
+
+    """
+
+    def __init__(
+        self,
+        token_path: Optional[str] = None,
+        api_key: Optional[str] = None,
+        app_secret: Optional[str] = None,
+        enforce_enums: bool = True,
+    ):
+        """初始化 AsyncSchwabAccount 實例
+
+        Args:
+            token_path (Optional[str]): 令牌文件路徑
+            api_key (Optional[str]): API 金鑰
+            app_secret (Optional[str]): 應用程式密鑰
+            enforce_enums (bool): 是否強制使用枚舉
+
+        Raises:
+            ValueError: 當必要的參數缺失時
+        """
+        super().__init__(
+            token_path=token_path,
+            api_key=api_key,
+            app_secret=app_secret,
+            enforce_enums=enforce_enums,
+        )
+
+        try:
+            self.async_client = client_from_token_file(
+                api_key=self.api_key,
+                app_secret=self.app_secret,
+                token_path=self.token_path,
+                asyncio=True,
+            )
+        except Exception as e:
+            logger.error('無法初始化 Schwab 非同步客戶端: %s', e)
+            raise
+
+        # 進行中的帳戶資料請求，並行的 async 查詢共用同一個 Task
+        self._snapshot_task: Optional[asyncio.Task] = None
+
+    async def _async_fetch_account_snapshot(self) -> List[Dict[str, Any]]:
+        """非同步取得包含持倉與餘額的帳戶資料
+
+        與 _fetch_account_snapshot 共用快取，並行呼叫時只送出一次請求。
+
+        Returns:
+            List[Dict[str, Any]]: Schwab 回傳的帳戶資料
+
+        Raises:
+            ValueError: 當 API 回傳非 200 狀態碼時
+        """
+        now = time.monotonic()
+        if self._accounts_cache is not None and now - self._accounts_cache_ts < self._snapshot_ttl:
+            return self._accounts_cache
+
+        if self._snapshot_task is None or self._snapshot_task.done():
+            self._snapshot_task = asyncio.ensure_future(self._async_request_account_snapshot(now))
+        return await self._snapshot_task
+
+    async def _async_request_account_snapshot(self, fetched_at: float) -> List[Dict[str, Any]]:
+        accounts_response = await self.async_client.get_accounts(fields=self._positions_field)
+        return self._store_account_snapshot(accounts_response, fetched_at)
+
+    async def async_get_position(self) -> Position:
+        """非同步獲取當前持倉
+
+        Returns:
+            Position: 當前持倉資訊
+        """
+        try:
+            return accounts_to_position(await self._async_fetch_account_snapshot())
+        except Exception as e:
+            logger.error('API: 獲取持倉時發生錯誤: %s', e)
+            return Position.from_list([])
+
+    async def async_get_total_balance(self) -> float:
+        """非同步獲取總資產餘額
+
+        Returns:
+            float: 總資產餘額
+        """
+        try:
+            return accounts_to_total_balance(await self._async_fetch_account_snapshot())
+        except Exception as e:
+            logger.error('API: 獲取總資產餘額時發生錯誤: %s', e)
+            return 0
+
+    async def async_get_cash(self) -> float:
+        """非同步獲取現金餘額
+
+        Returns:
+            float: 現金餘額
+        """
+        try:
+            return accounts_to_cash(await self._async_fetch_account_snapshot())
+        except Exception as e:
+            logger.error('API: 獲取現金餘額時發生錯誤: %s', e)
+            return 0
+
+    async def async_get_orders(self) -> Dict[int, Order]:
+        """非同步獲取所有未完成的訂單
+
+        Returns:
+            Dict[int, Order]: 訂單ID到訂單對象的映射
+        """
+        try:
+            return orders_response_to_orders(
+                await self.async_client.get_orders_for_all_linked_accounts(
+                    from_entered_datetime=datetime.now(timezone.utc) - self.order_lookback
+                )
+            )
+        except Exception as e:
+            logger.error('API: 獲取訂單時發生錯誤: %s', e)
+            return {}
+
+    async def refresh_all(self) -> Tuple[Position, float, Dict[int, Order]]:
+        """同時獲取持倉、現金餘額與未完成訂單
+
+        持倉與現金共用一次帳戶資料請求，並與訂單查詢同時送出。
+
+        Returns:
+            Tuple[Position, float, Dict[int, Order]]: 持倉、現金餘額與未完成訂單
+        """
+        position, cash, orders = await asyncio.gather(
+            self.async_get_position(), self.async_get_cash(), self.async_get_orders()
+        )
+        return position, cash, orders
+
+
+def accounts_to_position(accounts: List[Dict[str, Any]]) -> Position:
+    """將 Schwab 的帳戶資料轉換成 FinLab 的持倉
+
+    Args:
+        accounts (List[Dict[str, Any]]): Schwab get_accounts 回傳的帳戶資料
+
+    Returns:
+        Position: 持倉資訊
+    """
+    # 沒有持倉時 Schwab 不會回傳 positions 欄位
+    position = _dig(accounts, *_POSITIONS_PATH) or ()
+
+    ret = []
+    for p in position:
+        # 計算 quantity，需要考慮 longQuantity 和 shortQuantity
+        long_qty = p.get('longQuantity', 0)
+        short_qty = p.get('shortQuantity', 0)
+        ret.append({
+            'stock_id': p['instrument']['symbol'],
+            'quantity': (Decimal(str(long_qty)) - Decimal(str(short_qty))) / _THOUSAND,
+            'order_condition': OrderCondition.SHORT_SELLING if short_qty > 0 else OrderCondition.CASH,
+        })
+
+    return Position.from_list(ret)
+
+
+def accounts_to_total_balance(accounts: List[Dict[str, Any]]) -> float:
+    """從 Schwab 的帳戶資料取出總資產餘額
+
+    Args:
+        accounts (List[Dict[str, Any]]): Schwab get_accounts 回傳的帳戶資料
+
+    Returns:
+        float: 總資產餘額
+    """
+    return float(_dig(accounts, *_TOTAL_BALANCE_PATH))
+
+
+def accounts_to_cash(accounts: List[Dict[str, Any]]) -> float:
+    """從 Schwab 的帳戶資料取出現金餘額
+
+    Args:
+        accounts (List[Dict[str, Any]]): Schwab get_accounts 回傳的帳戶資料
+
+    Returns:
+        float: 現金餘額
+    """
+    return float(_dig(accounts, *_CASH_PATH))
+
+
+def orders_response_to_orders(orders_response) -> Dict[int, Order]:
+    """將 Schwab 的委託單查詢回應轉換成未完成訂單
+
+    Args:
+        orders_response: Schwab get_orders_for_all_linked_accounts 的回應
+
+    Returns:
+        Dict[int, Order]: 訂單ID到訂單對象的映射，API 回傳非 200 狀態碼時為空字典
+    """
+    if orders_response.status_code != 200:
+        logger.error(
+            'API: 獲取訂單失敗: %s: %s', orders_response.status_code, orders_response.text
+        )
+        return {}
+
+    # 狀態只對應一次，同時用於篩選與建立 Order
+    new = OrderStatus.NEW
+    ret = {}
+    for t in _loads(orders_response.content):
+        status = _STATUS_MAP.get(t['status'])
+        if status is new:
+            ret[t['orderId']] = trade_to_order(t, status=status)
+    return ret
+
+
+def _dig(data: Any, *keys: Any) -> Any:
+    """依序以 keys 取出巢狀資料中的值
+
+    Args:
+        data (Any): Schwab 回傳的巢狀 list 或 dict
+        *keys (Any): 依序使用的索引或鍵值
+
+    Returns:
+        Any: 取出的值，任一層不存在時為 None
+    """
+    for key in keys:
+        try:
+            data = data[key]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return data
+
+
+def _build_order(
+    action_str: str, stock_id: str, quantity: int, price: Optional[float], market: bool
+) -> Dict[str, Any]:
+    """建立 Schwab 的單腳股票委託單
+
+    Args:
+        action_str (str): Schwab 的買賣方向，'BUY' 或 'SELL'
+        stock_id (str): 股票代碼
+        quantity (int): 股數
+        price (Optional[float]): 限價，市價單時忽略
+        market (bool): 是否為市價單
+
+    Returns:
+        Dict[str, Any]: Schwab 的委託單物件
+    """
+    order = {
+        **_ORDER_TEMPLATE,
+        'orderType': 'MARKET' if market else 'LIMIT',
+        'orderLegCollection': [
+            {
+                'instruction': action_str,
+                'instrument': {'assetType': 'EQUITY', 'symbol': stock_id},
+                'quantity': quantity,
+            }
+        ],
+    }
+
+    if not market:
+        order['price'] = format_price(price)
+
+    return order
+
+
+def format_price(price: Union[float, str, Decimal]) -> str:
+    """將限價格式化成 Schwab 接受的字串
+
+    Schwab 僅接受 1 美元以上兩位小數、以下四位小數的價格，超出的位數無條件捨去。
+
+    Args:
+        price (Union[float, str, Decimal]): 價格
+
+    Returns:
+        str: 格式化後的價格
+
+    Raises:
+        ValueError: 當價格為 None 時
+    """
+    if price is None:
+        raise ValueError('限價單必須指定價格')
+
+    if isinstance(price, (int, float)) and math.isfinite(price):
+        # 先 round 消除浮點誤差 (如 1.15 * 100 = 114.999...)，再無條件捨去
+        if price >= 1:
+            return f'{math.floor(round(price * 100, 6)) / 100:.2f}'
+        return f'{math.floor(round(price * 10000, 6)) / 10000:.4f}'
+
+    price_decimal = price if isinstance(price, Decimal) else Decimal(str(price))
+    quantum = _Q2 if price_decimal >= _ONE else _Q4
+    return str(price_decimal.quantize(quantum, rounding=ROUND_DOWN))
+
+
 def map_trade_status(status: str) -> OrderStatus:
     """將 Schwab 的委託單狀態轉換成 FinLab 的委託單狀態
 
@@ -403,32 +989,10 @@ def map_trade_status(status: str) -> OrderStatus:
     Returns:
         OrderStatus: FinLab 的委託單狀態
     """
-    status_map = {
-        'AWAITING_PARENT_ORDER': OrderStatus.NEW,
-        'AWAITING_CONDITION': OrderStatus.NEW,
-        'AWAITING_STOP_CONDITION': OrderStatus.NEW,
-        'AWAITING_MANUAL_REVIEW': OrderStatus.NEW,
-        'ACCEPTED': OrderStatus.NEW,
-        'AWAITING_UR_OUT': OrderStatus.NEW,
-        'PENDING_ACTIVATION': OrderStatus.NEW,
-        'QUEUED': OrderStatus.NEW,
-        'WORKING': OrderStatus.NEW,
-        'REJECTED': OrderStatus.CANCEL,
-        'PENDING_CANCEL': OrderStatus.NEW,
-        'CANCELED': OrderStatus.CANCEL,
-        'PENDING_REPLACE': OrderStatus.NEW,
-        'REPLACED': OrderStatus.CANCEL,
-        'FILLED': OrderStatus.FILLED,
-        'EXPIRED': OrderStatus.CANCEL,
-        'NEW': OrderStatus.NEW,
-        'AWAITING_RELEASE_TIME': OrderStatus.NEW,
-        'PENDING_ACKNOWLEDGEMENT': OrderStatus.NEW,
-        'PENDING_RECALL': OrderStatus.NEW,
-        'UNKNOWN': OrderStatus.NEW,
-    }
-    if status not in status_map:
-        raise ValueError(f'無效的狀態: {status}')
-    return status_map[status]
+    try:
+        return _STATUS_MAP[status]
+    except KeyError:
+        raise ValueError(f'無效的狀態: {status}') from None
 
 
 def map_order_condition(action: str) -> OrderCondition:
@@ -440,19 +1004,10 @@ def map_order_condition(action: str) -> OrderCondition:
     Returns:
         OrderCondition: FinLab 的訂單條件
     """
-    condition_map = {
-        'BUY': OrderCondition.CASH,  # EQUITY (Stocks and ETFs)
-        'SELL': OrderCondition.CASH,  # EQUITY (Stocks and ETFs)
-        'BUY_TO_COVER': OrderCondition.CASH,  # EQUITY (Stocks and ETFs)
-        'SELL_SHORT': OrderCondition.SHORT_SELLING,  # EQUITY (Stocks and ETFs)
-        'BUY_TO_OPEN': OrderCondition.CASH,  # Option
-        'BUY_TO_CLOSE': OrderCondition.CASH,  # Option
-        'SELL_TO_OPEN': OrderCondition.CASH,  # Option
-        'SELL_TO_CLOSE': OrderCondition.CASH,  # Option
-    }
-    if action not in condition_map:
-        raise ValueError(f'無效的操作: {action}')
-    return condition_map[action]
+    try:
+        return _CONDITION_MAP[action]
+    except KeyError:
+        raise ValueError(f'無效的操作: {action}') from None
 
 
 def map_action(action: str) -> Action:
@@ -464,41 +1019,34 @@ def map_action(action: str) -> Action:
     Returns:
         Action: FinLab 的買賣方向
     """
-    action_map = {
-        'BUY': Action.BUY,  # EQUITY (Stocks and ETFs)
-        'SELL': Action.SELL,  # EQUITY (Stocks and ETFs)
-        'BUY_TO_COVER': Action.BUY,  # EQUITY (Stocks and ETFs)
-        'SELL_SHORT': Action.SELL,  # EQUITY (Stocks and ETFs)
-        'BUY_TO_OPEN': Action.BUY,  # Option
-        'BUY_TO_CLOSE': Action.BUY,  # Option
-        'SELL_TO_OPEN': Action.SELL,  # Option
-        'SELL_TO_CLOSE': Action.SELL,  # Option
-    }
-    if action not in action_map:
-        raise ValueError(f'無效的操作: {action}')
-    return action_map[action]
+    try:
+        return _ACTION_MAP[action]
+    except KeyError:
+        raise ValueError(f'無效的操作: {action}') from None
 
 
-def trade_to_order(trade: Dict[str, Any]) -> Order:
+def trade_to_order(trade: Dict[str, Any], status: Optional[OrderStatus] = None) -> Order:
     """將 Schwab 的委託單轉換成 FinLab 格式
 
     Args:
         trade (Dict[str, Any]): Schwab 的委託單物件
+        status (Optional[OrderStatus]): 已轉換的委託單狀態，未提供時由 trade['status'] 轉換
 
     Returns:
-        Order: FinLab 格式的委託單, finlab 的 quantity 是 1 張, 所以 Schwab 的 quantity 要除以 1000
+        Order: FinLab 格式的委託單, finlab 的 quantity 是 1 張, 所以 Schwab 的 quantity 與 filledQuantity 都要除以 1000
     """
-    action = map_action(trade['orderLegCollection'][0]['instruction'])
-    status = map_trade_status(trade['status'])
-    order_condition = map_order_condition(
-        trade['orderLegCollection'][0]['instruction']
-    )
-    quantity = float(trade['quantity']) / 1000
-    filled_quantity = float(trade['filledQuantity'])
+    leg = trade['orderLegCollection'][0]
+    instruction = leg['instruction']
+    action = map_action(instruction)
+    if status is None:
+        status = map_trade_status(trade['status'])
+    order_condition = map_order_condition(instruction)
+    quantity = Decimal(str(trade['quantity'])) / _THOUSAND
+    filled_quantity = Decimal(str(trade['filledQuantity'])) / _THOUSAND
 
     return Order(
         order_id=trade['orderId'],
-        stock_id=trade['orderLegCollection'][0]['instrument']['symbol'],
+        stock_id=leg['instrument']['symbol'],
         action=action,
         price=trade['price'] if trade['orderType'] == "LIMIT" else None,
         quantity=quantity,
@@ -1,21 +1,117 @@
 import shioaji as sj
+import atexit
 import datetime
+import hashlib
 import time
 import os
-import re
 import math
+import random
 import logging
-import pandas as pd
+import threading
+import numpy as np
+from concurrent.futures import Future, ThreadPoolExecutor
 from decimal import Decimal
 
 from finlab.online.base_account import Account, Stock, Order
 from finlab.online.utils import estimate_stock_price
 from finlab.online.enums import *
-from finlab.online.order_executor import Position
+from finlab.online.order_executor import (
+    Position, AFTER_HOURS_ODD_LOT_START, AFTER_HOURS_FIXED_PRICE_START, AFTER_HOURS_END)
 from finlab import data
 from finlab.markets.tw import TWMarket
 
-pattern = re.compile(r'(?<!^)(?=[A-Z])')
+try:
+    from shioaji import error as _sj_error
+except ImportError:
+    _sj_error = None
+
+_LOT_COMMON = sj.constant.StockOrderLot.Common
+_LOT_FIXING = sj.constant.StockOrderLot.Fixing
+_LOT_ODD = sj.constant.StockOrderLot.Odd
+_LOT_INTRADAY_ODD = sj.constant.StockOrderLot.IntradayOdd
+
+# 台灣時間與 UTC 的時差
+_TW_OFFSET = datetime.timedelta(hours=8)
+
+# 零股數量換算成張數
+_DEC_1000 = Decimal(1000)
+
+# FinLab 的 Action 與 OrderCondition 對應到 Shioaji 的下單參數
+_ACTION_ENCODE = {
+    Action.BUY: 'Buy',
+    Action.SELL: 'Sell',
+}
+
+_ORDER_COND_ENCODE = {
+    OrderCondition.CASH: 'Cash',
+    OrderCondition.MARGIN_TRADING: 'MarginTrading',
+    OrderCondition.SHORT_SELLING: 'ShortSelling',
+    OrderCondition.DAY_TRADING_LONG: 'Cash',
+    OrderCondition.DAY_TRADING_SHORT: 'Cash',
+}
+
+# Shioaji 的委託單欄位對應到 FinLab 的格式
+_TRADE_STATUS_MAP = {
+    'PendingSubmit': OrderStatus.NEW,
+    'PreSubmitted': OrderStatus.NEW,
+    'Submitted': OrderStatus.NEW,
+    'Failed': OrderStatus.CANCEL,
+    'Cancelled': OrderStatus.CANCEL,
+    'Filled': OrderStatus.FILLED,
+    'Filling': OrderStatus.PARTIALLY_FILLED,
+    'PartFilled': OrderStatus.PARTIALLY_FILLED,
+}
+
+_ORDER_COND_MAP = {
+    'Cash': OrderCondition.CASH,
+    'MarginTrading': OrderCondition.MARGIN_TRADING,
+    'ShortSelling': OrderCondition.SHORT_SELLING,
+}
+
+_ACTION_MAP = {
+    'Buy': Action.BUY,
+    'Sell': Action.SELL,
+}
+
+# get_price_info 保留的參考價欄位
+_PINFO_COLUMNS = ['漲停價', '跌停價', '收盤價']
+
+# list_profit_loss 每次查詢的天數
+_PROFIT_LOSS_DAYS = 30
+
+# snapshots 可重試的暫時性錯誤：連線中斷、逾時，以及 shioaji 的逾時與系統維護錯誤 (依安裝的版本而定)
+_TRANSIENT_ERRORS = (ConnectionError, TimeoutError) + tuple(
+    e for e in (getattr(_sj_error, name, None) for name in ('TimeoutError', 'SystemMaintenance'))
+    if isinstance(e, type) and issubclass(e, BaseException))
+
+# api.snapshots 單次查詢的商品數上限
+_SNAPSHOT_CHUNK = 500
+
+# 已登入的 Shioaji API，登入憑證 (密鑰與憑證密碼只保留雜湊值) 對應到 (api, accounts)
+_LOGIN_CACHE = {}
+_LOGIN_LOCK = threading.Lock()
+
+
+class _RateLimiter:
+    # 令牌桶，限制每秒最多 rate 次請求，可累積最多 burst 個令牌 (預設為 rate)
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = rate if burst is None else burst
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
 
 
 class SinopacAccount(Account):
@@ -26,7 +122,8 @@ class SinopacAccount(Account):
     def __init__(self, api_key=None, secret_key=None,
                  certificate_person_id=None,
                  certificate_password=None,
-                 certificate_path=None):
+                 certificate_path=None,
+                 order_rate_limit=25):
 
         api_key = api_key or os.environ.get('SHIOAJI_API_KEY')
         secret_key = secret_key or os.environ.get('SHIOAJI_SECRET_KEY') or os.environ.get('SHIOAJI_API_SECRET')
@@ -38,87 +135,108 @@ class SinopacAccount(Account):
         certificate_person_id = certificate_person_id or os.environ.get(
             'SHIOAJI_CERT_PERSON_ID')
 
-        self.api = sj.Shioaji()
-        self.accounts = self.api.login(
-            api_key, secret_key, fetch_contract=False)
+        # 同一組憑證在同一個 process 中只登入並啟用憑證一次，之後建立的帳戶共用已登入的 API
+        # 密鑰與憑證密碼也納入比對，錯誤的密鑰不會沿用其他人已登入的連線；加鎖避免同時登入而遺失連線
+        secret_hash = hashlib.sha256(
+            f'{secret_key}\0{certificate_password}'.encode()).hexdigest()
+        key = (api_key, certificate_path, certificate_person_id, secret_hash)
+        with _LOGIN_LOCK:
+            cached = _LOGIN_CACHE.get(key)
+            if cached is None:
+                api = sj.Shioaji()
+                accounts = api.login(
+                    api_key, secret_key, fetch_contract=False)
+                api.activate_ca(
+                    ca_path=certificate_path,
+                    ca_passwd=certificate_password,
+                    person_id=certificate_person_id,
+                )
+                cached = _LOGIN_CACHE[key] = (api, accounts)
+
+        self.api, self.accounts = cached
 
         self.trades = {}
-
-        self.api.activate_ca(
-            ca_path=certificate_path,
-            ca_passwd=certificate_password,
-            person_id=certificate_person_id,
-        )
-
-    def __del__(self):
-        try:
-            self.api.logout()
-        except:
-            pass
-
+        self._contract_cache = {}
+
+        # list_positions 快取，get_position 與 get_total_balance 短時間內共用同一次查詢
+        self._positions_ttl = 0.5
+        self._positions_cache = None
+        self._positions_cache_ts = 0.0
+
+        # get_price_info 快取，跨日或超過 price_info_ttl 秒即過期
+        self.price_info_ttl = 60
+        self._pinfo_cache = None
+        self._pinfo_date = None
+        self._pinfo_ts = 0.0
+
+        # create_order 未指定價格時的 snapshots 批次，(股票代碼, Future)
+        self.snapshot_batch_window = 0.02
+        self._pending_snapshots = None
+        self._snapshot_lock = threading.Lock()
+
+        # create_orders 的送單頻率上限 (每秒筆數)
+        self._order_limiter = _RateLimiter(order_rate_limit)
+
+        # 交易日曆與已查過的成交日收盤時間
+        self._market = None
+        self._filled_time_cache = {}
+
+    @classmethod
+    def close_all(cls):
+        """登出所有共用的 Shioaji 連線"""
+        with _LOGIN_LOCK:
+            sessions = list(_LOGIN_CACHE.values())
+            _LOGIN_CACHE.clear()
+
+        for api, _ in sessions:
+            try:
+                api.logout()
+            except Exception as e:
+                logging.warning("close_all: Cannot logout: %s", e)
 
     def create_order(self, action, stock_id, quantity, price=None, odd_lot=False, market_order=False, best_price_limit=False, order_cond=OrderCondition.CASH):
 
-        # contract = self.api.Contracts.Stocks.get(stock_id)
-        contract = sj.contracts.Contract(
-            security_type='STK', code=stock_id, exchange='TSE')
-        pinfo = self.get_price_info()
-
-        if stock_id not in pinfo:
-            # warning
-            logging.warning(f"stock {stock_id} not in price info")
-            return
-        
-        limitup = float(pinfo[stock_id]['漲停價'])
-        limitdn = float(pinfo[stock_id]['跌停價'])
-        last_close = float(pinfo[stock_id]['收盤價'])
-
-        if stock_id not in pinfo:
-            raise Exception(f"stock {stock_id} not in price info")
+        contract = self._contract(stock_id)
 
         if quantity <= 0:
             raise Exception(f"quantity must be positive, got {quantity}")
 
-        if price == None:
-            price = self.api.snapshots([contract])[0].close
-
         price_type = sj.constant.StockPriceType.LMT
 
-        if market_order:
-            if action == Action.BUY:
-                price = limitup
-            elif action == Action.SELL:
-                price = limitdn
+        # 漲跌停價只有市價單與最佳限價單需要，一般限價單不查詢參考價
+        if market_order or best_price_limit:
+            row = self.get_price_info().get(stock_id)
+
+            if row is None:
+                # warning
+                logging.warning("stock %s not in price info", stock_id)
+                return
 
-        elif best_price_limit:
-            if action == Action.BUY:
-                price = limitdn
-            elif action == Action.SELL:
-                price = limitup
+            if market_order:
+                if action == Action.BUY:
+                    price = float(row['漲停價'])
+                elif action == Action.SELL:
+                    price = float(row['跌停價'])
 
-        if action == Action.BUY:
-            action = 'Buy'
-        elif action == Action.SELL:
-            action = 'Sell'
+            else:
+                if action == Action.BUY:
+                    price = float(row['跌停價'])
+                elif action == Action.SELL:
+                    price = float(row['漲停價'])
+
+        elif price == None:
+            price = self._snapshot_close(stock_id)
 
+        action = _ACTION_ENCODE[action]
         daytrade_short = order_cond == OrderCondition.DAY_TRADING_SHORT
-        daytrade_short = True if daytrade_short else False
-
-        order_cond = {
-            OrderCondition.CASH: 'Cash',
-            OrderCondition.MARGIN_TRADING: 'MarginTrading',
-            OrderCondition.SHORT_SELLING: 'ShortSelling',
-            OrderCondition.DAY_TRADING_LONG: 'Cash',
-            OrderCondition.DAY_TRADING_SHORT: 'Cash'
-        }[order_cond]
-
-        order_lot = sj.constant.StockOrderLot.IntradayOdd\
-            if odd_lot else sj.constant.StockOrderLot.Common
-        now = datetime.datetime.utcnow() + datetime.timedelta(hours=8)
-        if datetime.time(13, 40) < datetime.time(now.hour, now.minute) and datetime.time(now.hour, now.minute) < datetime.time(14, 30) and odd_lot:
-            order_lot = sj.constant.StockOrderLot.Odd
-        if datetime.time(14, 00) < datetime.time(now.hour, now.minute) and datetime.time(now.hour, now.minute) < datetime.time(14, 30) and not odd_lot:
-            order_lot = sj.constant.StockOrderLot.Fixing
+        order_cond = _ORDER_COND_ENCODE[order_cond]
+
+        now = datetime.datetime.utcnow() + _TW_OFFSET
+        minute_of_day = now.hour * 60 + now.minute
+        if odd_lot:
+            order_lot = _LOT_ODD if AFTER_HOURS_ODD_LOT_START < minute_of_day < AFTER_HOURS_END else _LOT_INTRADAY_ODD
+        else:
+            order_lot = _LOT_FIXING if AFTER_HOURS_FIXED_PRICE_START < minute_of_day < AFTER_HOURS_END else _LOT_COMMON
 
         order = self.api.Order(price=price,
                                quantity=quantity,
@@ -132,29 +250,93 @@ class SinopacAccount(Account):
                                custom_field="FiNlAB",
                                )
         trade = self.api.place_order(contract, order)
+        self._positions_cache = None
 
         self.trades[trade.status.id] = trade
         return trade.status.id
 
+    def create_orders(self, orders, max_workers=8):
+        """同時送出多筆委託
+
+        未指定價格的限價單會先以一次 snapshots 呼叫取得所有股票的收盤價。
+
+        Args:
+            orders (list of dict): create_order 的參數列表
+            max_workers (int): 同時送出的委託上限，送單頻率另受 order_rate_limit 限制
+
+        Returns:
+            list: 與 orders 順序相同的委託單號，無法送出的委託為 None
+        """
+        # 未指定價格的一般限價單以一次 snapshots 取得所有收盤價
+        def needs_price(o):
+            return (o.get('price') is None
+                    and not o.get('market_order') and not o.get('best_price_limit'))
+
+        need_price = {o['stock_id'] for o in orders if needs_price(o)}
+        if need_price:
+            snapshots = self._snapshots([self._contract(c) for c in need_price])
+            close = {s.code: s.close for s in snapshots}
+            orders = [{**o, 'price': close[o['stock_id']]}
+                      if needs_price(o) and o['stock_id'] in close else o
+                      for o in orders]
+
+        def place(kwargs):
+            self._order_limiter.acquire()
+            return self.create_order(**kwargs)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(orders)))) as executor:
+            futures = [executor.submit(place, o) for o in orders]
+
+        ret = []
+        for o, f in zip(orders, futures):
+            try:
+                ret.append(f.result())
+            except Exception as e:
+                logging.warning("create_orders: Cannot create order of %s: %s", o, e)
+                ret.append(None)
+        return ret
+
     def get_price_info(self):
-        ref = data.get('reference_price')
-        return ref.set_index('stock_id').to_dict(orient='index')
+        # 參考價每個交易日只更新一次，同一天內 price_info_ttl 秒內的下單共用同一份資料，
+        # 定期重新讀取以取得開盤前才發布的當日參考價
+        today = datetime.date.today()
+        now = time.monotonic()
+        if (self._pinfo_cache is None or self._pinfo_date != today
+                or now - self._pinfo_ts >= self.price_info_ttl):
+            ref = data.get('reference_price')
+            # 只取下單會用到的欄位，直接由 numpy 陣列組成 {stock_id: {欄位: 價格}}
+            values = ref[_PINFO_COLUMNS].to_numpy(dtype=np.float64).tolist()
+            self._pinfo_cache = {sid: dict(zip(_PINFO_COLUMNS, v))
+                                 for sid, v in zip(ref['stock_id'].tolist(), values)}
+            self._pinfo_date = today
+            self._pinfo_ts = now
+        return self._pinfo_cache
+
+    def invalidate_price_info(self):
+        self._pinfo_cache = None
+
+    def _contract(self, stock_id):
+        # 登入時未下載商品檔 (fetch_contract=False)，自行建立的合約在整個連線期間都不會變動
+        contract = self._contract_cache.get(stock_id)
+        if contract is None:
+            contract = self._contract_cache[stock_id] = sj.contracts.Contract(
+                security_type='STK', code=stock_id, exchange='TSE')
+        return contract
 
     def update_trades(self):
         self.api.update_status(self.api.stock_account)
         self.trades = {t.status.id: t for t in self.api.list_trades()}
 
     def update_order(self, order_id, price):
-        order = self.get_orders()[order_id]
-        trade = self.trades[order_id]
+        trade = self._get_trade(order_id)
 
         try:
             if trade.order.order_lot == 'IntradayOdd':
-                action = order.action
-                stock_id = order.stock_id
-                q = order.quantity - \
-                    order.filled_quantity
-                q *= 1000
+                # 盤中零股無法改價，以剩餘股數刪單後重新下單，需重新查詢最新的成交股數
+                trade = self._get_trade(order_id, force_refresh=True)
+                action = map_action(trade.order.action)
+                stock_id = trade.contract.code
+                q = trade.order.quantity - trade.status.deal_quantity
 
                 self.cancel_order(order_id)
                 self.create_order(
@@ -163,74 +345,138 @@ class SinopacAccount(Account):
                 self.api.update_order(trade, price=price)
         except ValueError as ve:
             logging.warning(
-                f"update_order: Cannot update price of order {order_id}: {ve}")
+                "update_order: Cannot update price of order %s: %s", order_id, ve)
+
+    def _get_trade(self, order_id, force_refresh=False):
+        # 已知的委託直接使用，只有找不到或指定 force_refresh 時才重新查詢委託
+        trade = None if force_refresh else self.trades.get(order_id)
+        if trade is None:
+            self.update_trades()
+            trade = self.trades[order_id]
+        return trade
+
+    def get_order(self, order_id):
+        return trade_to_order(self._get_trade(order_id))
 
-    def cancel_order(self, order_id):
+    def cancel_order(self, order_id, force_refresh=False):
+        self.api.cancel_order(self._get_trade(order_id, force_refresh))
+        self._positions_cache = None
+
+    def cancel_orders(self, order_ids):
         self.update_trades()
-        self.api.cancel_order(self.trades[order_id])
+        for order_id in order_ids:
+            try:
+                self.cancel_order(order_id)
+            except Exception as e:
+                logging.warning("cancel_orders: Cannot cancel order %s: %s", order_id, e)
 
-    def get_position(self):
+    def _list_positions(self):
+        now = time.monotonic()
+        if self._positions_cache is not None and now - self._positions_cache_ts < self._positions_ttl:
+            return self._positions_cache
 
-        position = self.api.list_positions(
+        self._positions_cache = self.api.list_positions(
             self.api.stock_account, unit=sj.constant.Unit.Share)
-        order_conditions = {
-            'Cash': OrderCondition.CASH,
-            'MarginTrading': OrderCondition.MARGIN_TRADING,
-            'ShortSelling': OrderCondition.SHORT_SELLING,
-        }
-        return Position.from_list([{
-            'stock_id': p.code,
-            'quantity': Decimal(p.quantity)/1000 if p.direction == 'Buy' else -Decimal(p.quantity)/1000,
-            'order_condition': order_conditions[p.cond]
-        } for p in position])
+        self._positions_cache_ts = now
+        return self._positions_cache
+
+    def get_position(self):
+
+        position = self._list_positions()
+        return Position.from_arrays(
+            [p.code for p in position],
+            [Decimal(p.quantity if p.direction == 'Buy' else -p.quantity) / _DEC_1000
+             for p in position],
+            [_ORDER_COND_MAP[p.cond] for p in position])
 
     def get_orders(self):
         self.update_trades()
-        return {t.status.id: trade_to_order(t) for name, t in self.trades.items()}
+        return {tid: trade_to_order(t) for tid, t in self.trades.items()}
 
     def get_stocks(self, stock_ids):
-        try:
-            contracts = [sj.contracts.Contract(
-                security_type='STK', code=s, exchange='TSE') for s in stock_ids]
-            snapshots = self.api.snapshots(contracts)
-        except:
-            time.sleep(10)
-            contracts = [sj.contracts.Contract(
-                security_type='STK', code=s, exchange='TSE') for s in stock_ids]
-            snapshots = self.api.snapshots(contracts)
-
+        snapshots = self._snapshots([self._contract(s) for s in stock_ids])
         return {s.code: snapshot_to_stock(s) for s in snapshots}
 
+    def _snapshot_close(self, stock_id):
+        # snapshot_batch_window 秒內陸續到達的查詢合併成一次 snapshots 呼叫
+        with self._snapshot_lock:
+            owner = self._pending_snapshots is None
+            if owner:
+                self._pending_snapshots = (set(), Future())
+            codes, future = self._pending_snapshots
+            codes.add(stock_id)
+
+        if owner:
+            time.sleep(self.snapshot_batch_window)
+            with self._snapshot_lock:
+                self._pending_snapshots = None
+            try:
+                snapshots = self._snapshots([self._contract(c) for c in codes])
+                future.set_result({s.code: s.close for s in snapshots})
+            except Exception as e:
+                future.set_exception(e)
+
+        return future.result()[stock_id]
+
+    def _snapshots(self, contracts, retries=4):
+        # 單次 snapshots 最多 _SNAPSHOT_CHUNK 檔，超過時分批平行查詢，各批次獨立重試
+        if len(contracts) <= _SNAPSHOT_CHUNK:
+            return self._snapshot_chunk(contracts, retries)
+
+        chunks = [contracts[i:i + _SNAPSHOT_CHUNK]
+                  for i in range(0, len(contracts), _SNAPSHOT_CHUNK)]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = executor.map(lambda c: self._snapshot_chunk(c, retries), chunks)
+            return [s for snapshots in results for s in snapshots]
+
+    def _snapshot_chunk(self, contracts, retries):
+        # 暫時性錯誤以指數退避重試 (約 2、4、8 秒)，總等待時間涵蓋 Shioaji 的流量限制區間，其他錯誤直接拋出
+        for attempt in range(retries):
+            try:
+                return self.api.snapshots(contracts)
+            except _TRANSIENT_ERRORS as e:
+                if attempt == retries - 1:
+                    raise
+                delay = 2 * 2 ** attempt + random.random() * 0.5
+                logging.warning("snapshots: attempt %s failed, retry in %.2fs: %s",
+                                attempt + 1, delay, e)
+                time.sleep(delay)
+
     def get_total_balance(self):
 
-        # get position balance
-        # lp = self.api.list_positions()
-        lp = self.api.list_positions(
-            self.api.stock_account, unit=sj.constant.Unit.Share)
+        # 持倉、交割款與現金餘額互不相依，同時查詢
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            lp = executor.submit(self._list_positions)
+            settlement = executor.submit(self.get_settlement)
+            cash = executor.submit(self.get_cash)
+            lp, settlement, cash = lp.result(), settlement.result(), cash.result()
 
-        ac_pos = pd.DataFrame([p.dict() for p in lp])
+        if len(lp) == 0:
+            return settlement + cash
 
-        if len(ac_pos) == 0:
-            return self.get_settlement() + self.get_cash()
+        # get position balance，融資金額與利息欄位可能不存在
+        last_price = np.fromiter((p.last_price for p in lp), dtype=np.float64, count=len(lp))
+        quantity = np.fromiter((p.quantity for p in lp), dtype=np.float64, count=len(lp))
+        margin = np.fromiter((getattr(p, 'margin_purchase_amount', 0) or 0 for p in lp),
+                             dtype=np.float64, count=len(lp))
+        interest = np.fromiter((getattr(p, 'interest', 0) or 0 for p in lp),
+                               dtype=np.float64, count=len(lp))
 
-        return ((ac_pos.last_price * ac_pos.quantity) * (1 - 1.425/1000) * (1 - 3/1000)  \
-                - ac_pos.get('margin_purchase_amount', 0) - ac_pos.get('interest', 0)).sum() \
-                + self.get_settlement() + self.get_cash()
+        return ((last_price * quantity) * (1 - 1.425/1000) * (1 - 3/1000)
+                - margin - interest).sum() + settlement + cash
 
     def get_cash(self):
         return self.api.account_balance().acc_balance
 
     def get_settlement(self):
-        tw_now = datetime.datetime.utcnow() + datetime.timedelta(hours=8)
+        tw_now = datetime.datetime.utcnow() + _TW_OFFSET
         settlements = self.api.settlements(self.api.stock_account)
 
-        # Settlement time is at 3:00 AM
-        def settlement_time(date): 
-            t = datetime.time(3, 0)
-            return datetime.datetime.combine(date, t)
+        # Settlement time is at 3:00 AM，交割日 03:00 晚於現在等同交割日晚於 3 小時前的日期
+        cutoff = (tw_now - datetime.timedelta(hours=3)).date()
 
-        return sum(int(settlement.amount) for settlement in settlements 
-                   if settlement_time(settlement.date) > tw_now)
+        return sum(int(settlement.amount) for settlement in settlements
+                   if settlement.date > cutoff)
 
 
     def sep_odd_lot_order(self):
@@ -238,16 +484,24 @@ class SinopacAccount(Account):
     
 
     def get_market(self):
-        return TWMarket()
+        if self._market is None:
+            self._market = TWMarket()
+        return self._market
+
+    def _filled_time(self, date):
+        # 成交時間為該日收盤 13:30，同一日期只向交易日曆查詢一次
+        t = self._filled_time_cache.get(date)
+        if t is None:
+            # date 格式固定為 YYYY-MM-DD，直接切字串取代 strptime
+            d = datetime.datetime(int(date[0:4]), int(date[5:7]), int(date[8:10]))
+            t = self._filled_time_cache[date] = self.get_market().market_close_at_timestamp(d)\
+                .to_pydatetime().replace(hour=13, minute=30)
+        return t
     
 
     @staticmethod
     def _map_order_condition(order_condition):
-        return {
-            'Cash': OrderCondition.CASH,
-            'MarginTrading': OrderCondition.MARGIN_TRADING,
-            'ShortSelling': OrderCondition.SHORT_SELLING,
-        }[order_condition]
+        return _ORDER_COND_MAP[order_condition]
     
 
     def _get_sell_orders(self, start=None, end=None):
@@ -258,15 +512,28 @@ class SinopacAccount(Account):
         if end is None:
             end = datetime.datetime.now()
 
-        if hasattr(start, 'strftime'):
-            start = start.strftime('%Y-%m-%d')
+        if isinstance(start, str):
+            start = datetime.datetime.fromisoformat(start)
 
-        if hasattr(end, 'strftime'):
-            end = end.strftime('%Y-%m-%d')
+        if isinstance(end, str):
+            end = datetime.datetime.fromisoformat(end)
 
+        # 長區間切成每段 _PROFIT_LOSS_DAYS 天平行查詢，避免單次回應過大
+        ranges = []
+        day = start.date() if hasattr(start, 'date') else start
+        last = end.date() if hasattr(end, 'date') else end
+        while True:
+            until = min(day + datetime.timedelta(days=_PROFIT_LOSS_DAYS - 1), last)
+            ranges.append((day.strftime('%Y-%m-%d'), until.strftime('%Y-%m-%d')))
+            if until >= last:
+                break
+            day = until + datetime.timedelta(days=1)
 
-        profitloss = self.api.list_profit_loss(self.api.stock_account, start, end)
-        market = self.get_market()
+        def profit_loss(r):
+            return self.api.list_profit_loss(self.api.stock_account, r[0], r[1])
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            profitloss = [p for pl in executor.map(profit_loss, ranges) for p in pl]
 
         sell_orders = []
         for p in profitloss:
@@ -280,9 +547,7 @@ class SinopacAccount(Account):
                 status=OrderStatus.FILLED,
                 order_condition=self._map_order_condition(p.cond) \
                     if hasattr(p, 'cond') else OrderCondition.CASH,
-                time=market.market_close_at_timestamp(
-                    datetime.datetime.strptime(p.date, '%Y-%m-%d'))\
-                        .to_pydatetime().replace(hour=13, minute=30),
+                time=self._filled_time(p.date),
                 org_order=p
             ))
         return sell_orders
@@ -291,13 +556,21 @@ class SinopacAccount(Account):
     def _get_buy_orders(self):
 
         buy_orders = []
-        
-        market = self.get_market()
+
         position = self.api.list_positions(self.api.stock_account)
-        
-        for i, p in enumerate(position):
-            position_detail = self.api.list_position_detail(self.api.stock_account, p.id)
-        
+
+        # 平行查詢各持倉明細，以令牌桶維持約每 5 秒 20 次的查詢上限，不允許一開始就爆量
+        limiter = _RateLimiter(4, burst=1)
+
+        def position_detail(p):
+            limiter.acquire()
+            return self.api.list_position_detail(self.api.stock_account, p.id)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            details = list(executor.map(position_detail, position))
+
+        for p, position_detail in zip(position, details):
+
             for pp in position_detail:
 
                 if pp.quantity == 0:
@@ -312,14 +585,9 @@ class SinopacAccount(Account):
                     filled_quantity=pp.quantity,
                     status=OrderStatus.FILLED,
                     order_condition=map_order_condition(p.cond),
-                    time=market.market_close_at_timestamp(
-                        datetime.datetime.strptime(pp.date, '%Y-%m-%d'))\
-                            .to_pydatetime().replace(hour=13, minute=30),
+                    time=self._filled_time(pp.date),
                     org_order=pp
                 ))
-        
-            if i % 20 == 19 and i != len(position) - 1:
-                time.sleep(5)
 
         return buy_orders
 
@@ -332,8 +600,9 @@ class SinopacAccount(Account):
         if isinstance(end, str):
             end = datetime.datetime.fromisoformat(end)
 
-        start = TWMarket().market_close_at_timestamp(start - datetime.timedelta(days=1))
-        end = TWMarket().market_close_at_timestamp(end)
+        market = self.get_market()
+        start = market.market_close_at_timestamp(start - datetime.timedelta(days=1))
+        end = market.market_close_at_timestamp(end)
 
         start = start.replace(hour=0, minute=0, second=0, microsecond=0)
         end = end.replace(hour=23, minute=59, second=59, microsecond=999999)
@@ -343,64 +612,53 @@ class SinopacAccount(Account):
         orders = buy_orders + sell_orders
 
         return [o for o in orders if start <= o.time <= end]
-    
+
+
+# 在模組卸載前登出共用連線，避免直譯器關閉時才拆除 Shioaji 連線而卡住
+atexit.register(SinopacAccount.close_all)
+
 
 def map_trade_status(status):
-    return {
-        'PendingSubmit': OrderStatus.NEW,
-        'PreSubmitted': OrderStatus.NEW,
-        'Submitted': OrderStatus.NEW,
-        'Failed': OrderStatus.CANCEL,
-        'Cancelled': OrderStatus.CANCEL,
-        'Filled': OrderStatus.FILLED,
-        'Filling': OrderStatus.PARTIALLY_FILLED,
-        'PartFilled': OrderStatus.PARTIALLY_FILLED,
-    }[status]
+    return _TRADE_STATUS_MAP[status]
 
 def map_order_condition(order_condition):
-    return {
-        'Cash': OrderCondition.CASH,
-        'MarginTrading': OrderCondition.MARGIN_TRADING,
-        'ShortSelling': OrderCondition.SHORT_SELLING,
-    }[order_condition]
+    return _ORDER_COND_MAP[order_condition]
 
 def map_action(action):
-    return {
-        'Buy': Action.BUY,
-        'Sell': Action.SELL
-    }[action]
+    return _ACTION_MAP[action]
 
 def trade_to_order(trade):
     """將 shioaji package 的委託單轉換成 finlab 格式"""
-    action = map_action(trade.order.action)
-    status = map_trade_status(trade.status.status)
-    order_condition = map_order_condition(trade.order.order_cond)
+    o = trade.order
+    s = trade.status
+
+    action = _ACTION_MAP[o.action]
+    status = _TRADE_STATUS_MAP[s.status]
+    order_condition = _ORDER_COND_MAP[o.order_cond]
 
     # calculate order condition
-    if trade.order.daytrade_short == True and order_condition == OrderCondition.CASH:
+    if o.daytrade_short == True and order_condition == OrderCondition.CASH:
         order_condition = OrderCondition.DAY_TRADING_SHORT
 
     # calculate quantity
     # calculate filled quantity
-    quantity = Decimal(trade.order.quantity)
-    filled_quantity = Decimal(trade.status.deal_quantity)
-
-    if trade.order.order_lot == 'IntradayOdd':
-        quantity /= 1000
-        filled_quantity /= 1000
-
-    return Order(**{
-        'order_id': trade.status.id,
-        'stock_id': trade.contract.code,
-        'action': action,
-        'price': trade.order.price if trade.status.modified_price == 0 else trade.status.modified_price,
-        'quantity': quantity,
-        'filled_quantity': filled_quantity,
-        'status': status,
-        'order_condition': order_condition,
-        'time': trade.status.order_datetime,
-        'org_order': trade
-    })
+    quantity = Decimal(o.quantity)
+    filled_quantity = Decimal(s.deal_quantity)
+
+    if o.order_lot == 'IntradayOdd':
+        quantity /= _DEC_1000
+        filled_quantity /= _DEC_1000
+
+    return Order(order_id=s.id,
+                 stock_id=trade.contract.code,
+                 action=action,
+                 price=o.price if s.modified_price == 0 else s.modified_price,
+                 quantity=quantity,
+                 filled_quantity=filled_quantity,
+                 status=status,
+                 order_condition=order_condition,
+                 time=s.order_datetime,
+                 org_order=trade)
 
 
 def snapshot_to_stock(snapshot):
@@ -23,35 +23,77 @@ print('SHIOAJI_CERT_PASSWORD', os.environ['SHIOAJI_CERT_PASSWORD'])
 print('-------------------------')
 
 
+def _wait_until(fetch, condition, timeout=11, interval=0.25):
+    # 輪詢 fetch() 直到結果符合 condition，最多等待 timeout 秒，回傳最後一次的結果
+    deadline = time.monotonic() + timeout
+    value = fetch()
+    while not condition(value) and time.monotonic() < deadline:
+        time.sleep(interval)
+        value = fetch()
+    return value
+
+
+def _orders_settled(orders):
+    # 所有委託都已取消或成交
+    return all(o.status in (OrderStatus.CANCEL, OrderStatus.FILLED)
+               for o in orders.values())
+
+
+def _orders_placed(view_orders):
+    # view_orders 中每一檔股票未取消、未成交的委託張數合計都已達到預期 (整股與零股分開下單，需等兩筆都出現)
+    expected = {o['stock_id']: float(abs(o['quantity'])) for o in view_orders if o['quantity'] != 0}
+
+    def condition(orders):
+        quantity = dict.fromkeys(expected, 0)
+        for o in orders.values():
+            if o.stock_id in quantity and o.status not in (OrderStatus.CANCEL, OrderStatus.FILLED):
+                quantity[o.stock_id] += o.quantity
+        return all(float(round(quantity[sid], 4)) == q for sid, q in expected.items())
+
+    return condition
+
+
+def _orders_replaced(orders, oids):
+    # 改價後的委託已出現：零股的舊委託全部取消或成交並有新的委託，整股則是原委託直接改價
+    prices = {oid: orders[oid].price for oid in oids}
+
+    def condition(orders_new):
+        replaced = all(orders_new[oid].status in (OrderStatus.CANCEL, OrderStatus.FILLED)
+                       for oid in oids if oid in orders_new) \
+            and any(o.status == OrderStatus.NEW and oid not in prices
+                    for oid, o in orders_new.items())
+        repriced = all(oid in orders_new and orders_new[oid].price != price
+                       for oid, price in prices.items())
+        return replaced or repriced
+
+    return condition
+
+
 def check_order_executor(self, oe, **args_for_creating_orders):
     # check order executor results
     view_orders = oe.create_orders(view_only=True)
 
     oe.cancel_orders()
-    time.sleep(11)
+    _wait_until(oe.account.get_orders, _orders_settled)
     oe.create_orders(**args_for_creating_orders)
-    time.sleep(5)
-    orders = oe.account.get_orders()
+    orders = _wait_until(oe.account.get_orders, _orders_placed(view_orders), timeout=5)
 
     stock_orders = {o['stock_id']: o for o in view_orders}
-    stock_quantity = {o.stock_id: 0 for oid, o in orders.items()}
-
-    for oid, o in orders.items():
-        if o.status == OrderStatus.CANCEL\
-            or o.stock_id not in stock_orders\
-                or o.status == OrderStatus.FILLED:
-            continue
-
-        # get stock id
-        sid = o.stock_id
-
-        # check order condition and action
-        expect_action = Action.BUY if stock_orders[sid]['quantity'] > 0 else Action.SELL
-
-        stock_quantity[sid] += o.quantity
-        self.assertEqual(o.action, expect_action)
-        self.assertEqual(o.order_condition,
-                         stock_orders[sid]['order_condition'])
+    done = (OrderStatus.CANCEL, OrderStatus.FILLED)
+    active = [o for o in orders.values()
+              if o.status not in done and o.stock_id in stock_orders]
+
+    # check order condition and action，一次比對所有委託
+    stock_quantity = {}
+    actual, expected = [], []
+    for o in active:
+        expect = stock_orders[o.stock_id]
+        stock_quantity[o.stock_id] = stock_quantity.get(o.stock_id, 0) + o.quantity
+        actual.append((o.stock_id, o.action, o.order_condition))
+        expected.append((o.stock_id,
+                         Action.BUY if expect['quantity'] > 0 else Action.SELL,
+                         expect['order_condition']))
+    self.assertListEqual(actual, expected)
 
     for sid, q in stock_quantity.items():
         if q != 0:
@@ -73,7 +115,7 @@ def f_test_account(self, fa, odd_lot=False):
         q2330 = 2
         q1101 = 1
 
-    time.sleep(11)
+    _wait_until(fa.get_orders, _orders_settled)
     oe = OrderExecutor(Position({sid1: q2330, sid2: q1101}), account=fa)
     check_order_executor(self, oe)
 
@@ -84,12 +126,12 @@ def f_test_account(self, fa, odd_lot=False):
         q2330 = 2
         q1101 = -1
 
-    time.sleep(11)
+    _wait_until(fa.get_orders, _orders_settled)
     oe = OrderExecutor(
         Position({sid1: q2330, sid2: q1101}, day_trading_short=True), account=fa)
     check_order_executor(self, oe)
 
-    time.sleep(11)
+    _wait_until(fa.get_orders, _orders_settled)
     oe = OrderExecutor(
         Position({sid1: q2330, sid2: q1101}, day_trading_short=True), account=fa)
     check_order_executor(self, oe, market_order=True)
@@ -103,22 +145,17 @@ def f_test_update_price(self, fa, odd_lot=False):
         q6016 = 2
     oe = OrderExecutor(Position({sid1: q6016}), account=fa)
     view_orders = oe.create_orders(view_only=True)
-    time.sleep(11)
+    _wait_until(fa.get_orders, _orders_settled)
     oe.create_orders()
-    orders = oe.account.get_orders()
+    orders = _wait_until(fa.get_orders, _orders_placed(view_orders))
 
     # get first order ids
-    oids = []
-    for oid, o in orders.items():
-        if o.status == OrderStatus.NEW:
-            oids.append(oid)
+    oids = [oid for oid, o in orders.items() if o.status == OrderStatus.NEW]
 
-    time.sleep(11)
     oe.update_order_price(extra_bid_pct=0.05)
-    time.sleep(1)
 
     # check first order is canceled
-    orders_new = oe.account.get_orders()
+    orders_new = _wait_until(fa.get_orders, _orders_replaced(orders, oids))
     for oid in oids:
         continue
         orders_new[oid]
@@ -148,11 +185,13 @@ def f_test_update_price(self, fa, odd_lot=False):
 
 class TestSinopacAccount(unittest.TestCase):
 
-    def setUp(self):
+    @classmethod
+    def setUpClass(cls):
+        """所有測試共用同一組已登入的帳戶"""
         from finlab.online.sinopac_account import SinopacAccount
         from finlab.online.fugle_account import FugleAccount
-        self.sinopac_account = SinopacAccount()
-        self.fugle_account = FugleAccount()
+        cls.sinopac_account = SinopacAccount()
+        cls.fugle_account = FugleAccount()
 
     def test_sinopac_get_total_balance(self):
         total_balance = self.sinopac_account.get_total_balance()
@@ -218,12 +257,11 @@ class TestSinopacAccount(unittest.TestCase):
         assert pos.position[0] == pos2.position[0]
 
     def test_show_alerting_stocks(self):
-        from finlab.online.sinopac_account import SinopacAccount
-        acc = SinopacAccount()
+        acc = self.sinopac_account
         acc.get_total_balance()
         df = data.get('reference_price')
         stocks = df.stock_id[df.stock_id.str.len() == 4].to_list()
-        oe = OrderExecutor(Position(dict(zip(stocks, len(stocks) * [1]))), acc)
+        oe = OrderExecutor(Position.from_arrays(stocks, [1] * len(stocks)), acc)
         oe.show_alerting_stocks()
 
     def test_position(self):
@@ -244,6 +282,12 @@ class TestSinopacAccount(unittest.TestCase):
             if o['stock_id'] == "1101":
                 assert o['quantity'] == 1
 
+        # test position from arrays
+        pos = Position.from_arrays(['2330', '1101'], [2, '1.5'])
+        assert pos.position[0] == {'stock_id': '2330', 'quantity': 2,
+                                   'order_condition': OrderCondition.CASH}
+        assert pos.position[1]['quantity'] == Decimal('1.5')
+
         # test decimal quantity
         pos = Position({"2330": Decimal('1.1')})
         pos = Position.from_list(pos.to_list())
@@ -395,6 +439,17 @@ class TestSchwabAccount(unittest.TestCase):
             order_cond=OrderCondition.CASH,
         )
 
+    def test_create_order_invalid_symbol(self):
+        # 無效的股票代碼不會拋出例外，而是由 Schwab 拒絕並記錄警告
+        with self.assertLogs('schwab_account', level='WARNING') as logs:
+            self.schwab_account.create_order(
+                action=Action.BUY,
+                stock_id='NOT_A_SYMBOL',
+                quantity=1,
+                price=30.0,
+            )
+        self.assertTrue(any('無法創建訂單' in line for line in logs.output))
+
     def test_get_price_info(self):
         price_info = self.schwab_account.get_price_info(['AAPL'])
         self.assertIn('AAPL', price_info)
@@ -423,6 +478,31 @@ class TestSchwabAccount(unittest.TestCase):
         self.assertIsInstance(cash, float)
 
 
+class FormatPriceTest(unittest.TestCase):
+    def test_format_price(self):
+        from schwab_account import format_price
+        test_data = {
+            'float_1': {'price': 1.15, 'expected_result': '1.15'},
+            'float_2': {'price': 123.456, 'expected_result': '123.45'},
+            'float_3': {'price': 187.5, 'expected_result': '187.50'},
+            'float_4': {'price': 0.12345, 'expected_result': '0.1234'},
+            'int_1': {'price': 1, 'expected_result': '1.00'},
+            'decimal_1': {'price': Decimal('1.159'), 'expected_result': '1.15'},
+            'decimal_2': {'price': Decimal('0.98765'), 'expected_result': '0.9876'},
+            'str_1': {'price': '2.999', 'expected_result': '2.99'},
+            'str_2': {'price': '0.00015', 'expected_result': '0.0001'},
+        }
+
+        for test_name, test_case in test_data.items():
+            with self.subTest(test_name=test_name):
+                self.assertEqual(format_price(test_case['price']), test_case['expected_result'])
+
+    def test_format_price_none(self):
+        from schwab_account import format_price
+        with self.assertRaises(ValueError):
+            format_price(None)
+
+
 class CalculatePriceWithExtraBidTest(unittest.TestCase):
     def test_calculate_price_with_extra_bid(self):
         from finlab.online.order_executor import calculate_price_with_extra_bid
@@ -452,6 +532,22 @@ class CalculatePriceWithExtraBidTest(unittest.TestCase):
                     price, extra_bid_pct if action == Action.BUY else -extra_bid_pct)
                 self.assertEqual(result, expected_result)
 
+    def test_calculate_price_with_extra_bid_batch(self):
+        import numpy as np
+        from finlab.online.order_executor import calculate_price_with_extra_bid, calculate_price_with_extra_bid_batch
+        prices = [5.2, 7.4, 25.65, 11.05, 87.0, 73.0, 234.0, 234.0, 650.0, 756.0, 1990.0, 1455.0,
+                  2.21, 2.79, 2.39, 2.05, 1.1]
+        pcts = [0.06, -0.02, 0.1, -0.1, 0.04, -0.06, 0.08, -0.08, 0.05, -0.055, 0.035, -0.088,
+                0.05, 0.05, -0.05, 0.01, 0.055]
+        expected = [5.51, 7.26, 28.20, 9.95, 90.4, 68.7, 252.5, 215.5, 682, 715, 2055, 1330,
+                    2.32, 2.92, 2.28, 2.07, 1.16]
+
+        result = calculate_price_with_extra_bid_batch(prices, pcts)
+        self.assertTrue(np.allclose(result, expected))
+        self.assertTrue(np.allclose(
+            result, [calculate_price_with_extra_bid(p, e) for p, e in zip(prices, pcts)]))
+        self.assertTrue(np.allclose(calculate_price_with_extra_bid_batch([50.0], 0), [50.0]))
+
     def test_extra_bid_and_up_down_limit(self):
         from finlab.online.order_executor import calculate_price_with_extra_bid
         action = Action.BUY